@@ -2,19 +2,131 @@
 from mingus.containers import Note as MingusNote, NoteContainer
 import numpy as np
 import simpleaudio as sa
+import logging
 import threading
+import time
+from lpminimk3.colors._colors import RgbColor
+from lpminimk3.midi_messages import Colorspec, ColorspecFragment, Constants
+
+logger = logging.getLogger(__name__)
 
 def generate_sine_wave(frequency, duration, sample_rate=44100, amplitude=0.5):
-    t = np.linspace(0, duration, int(sample_rate * duration), False)
-    wave = amplitude * np.sin(2 * np.pi * frequency * t)
-    wave = (wave * 32767).astype(np.int16)
-    return wave
+    # Phase, sine and gain are computed in place in one float buffer; only the int16 result is allocated
+    n = int(sample_rate * duration)
+    wave = np.arange(n, dtype=np.float64)
+    wave *= 2 * np.pi * frequency * duration / n if n else 0
+    np.sin(wave, out=wave)
+    wave *= amplitude * 32767
+    return wave.astype(np.int16)
 
 def play_wave(wave):
     play_obj = sa.play_buffer(wave, 1, 2, 44100)
     return play_obj
 
+def led_midi_value(lp, midi_values, x, y):
+    # lp.panel.led() builds a new Led (and coordinate lookup) per call; resolve each LED once into
+    # midi_values, a (x, y) -> MIDI value cache owned by whoever owns lp and its layout
+    midi_value = midi_values.get((x, y))
+    if midi_value is None:
+        midi_value = midi_values[(x, y)] = lp.panel.led(x, y).midi_value
+    return midi_value
+
+def send_leds(lp, leds, midi_values):
+    # Send every (x, y, color) in a single SysEx colorspec message instead of one message per LED.
+    # Colors are checked the same way led.color checks them, before anything is sent, since one
+    # out-of-range byte would corrupt the whole batch rather than a single LED.
+    fragments = []
+    for x, y, color in leds:
+        if not RgbColor.is_valid(color):
+            raise ValueError('Invalid color.')
+        rgb = RgbColor(color)  # Scales 0-255 down to the device's 0-127
+        midi_value = led_midi_value(lp, midi_values, x, y)
+        fragments.append(ColorspecFragment(Constants.LightingType.RGB, midi_value, rgb.r, rgb.g, rgb.b))
+    if fragments:
+        lp.send_message(Colorspec(*fragments))
+
+class Sustainer:
+    # One background thread re-triggers the 1-second buffer of every held note,
+    # instead of each note or chord running its own playback thread. It sleeps
+    # until the next buffer is due to end rather than polling on a fixed interval.
+    def __init__(self, sample_rate=44100, retry=0.005):
+        self.sample_rate = sample_rate
+        self.retry = retry  # Re-check delay when a buffer is still finishing at its deadline
+        self.voices = {}  # owner -> list of [wave, play_obj, deadline]
+        self.wakeup = threading.Condition()
+        self.thread = None
+
+    def hold(self, owner, waves):
+        with self.wakeup:
+            if owner in self.voices:
+                return
+            voices = [voice for voice in map(self.start_voice, waves) if voice]
+            if not voices:
+                return
+            self.voices[owner] = voices
+            if not self.thread or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.wakeup.notify()
+
+    def release(self, owner):
+        with self.wakeup:
+            voices = self.voices.pop(owner, [])
+        for wave, play_obj, deadline in voices:
+            play_obj.stop()
+
+    def start_voice(self, wave):
+        # An audio error (device busy or gone) drops this voice instead of reaching the button path or the sustain thread
+        try:
+            play_obj = play_wave(wave)
+        except Exception:
+            logger.exception("Could not play note buffer; dropping voice")
+            return None
+        return [wave, play_obj, time.monotonic() + len(wave) / self.sample_rate]
+
+    def advance_voice(self, voice, now):
+        # Returns the voice's next deadline, or None when an audio error means it should be dropped
+        wave, play_obj, deadline = voice
+        if deadline > now:
+            return deadline
+        try:
+            if play_obj.is_playing():
+                voice[2] = now + self.retry
+                return voice[2]
+        except Exception:
+            logger.exception("Could not query note buffer; dropping voice")
+            return None
+        restarted = self.start_voice(wave)
+        if not restarted:
+            return None
+        voice[:] = restarted
+        return voice[2]
+
+    def run(self):
+        with self.wakeup:
+            while True:
+                now = time.monotonic()
+                next_deadline = None
+                for owner, voices in list(self.voices.items()):
+                    kept = []
+                    for voice in voices:
+                        deadline = self.advance_voice(voice, now)
+                        if deadline is None:
+                            continue
+                        kept.append(voice)
+                        if next_deadline is None or deadline < next_deadline:
+                            next_deadline = deadline
+                    if kept:
+                        voices[:] = kept
+                    else:
+                        del self.voices[owner]  # Let a later hold() start this owner again
+                self.wakeup.wait(None if next_deadline is None else next_deadline - now)
+
+sustainer = Sustainer()
+
 class Button:
+    __slots__ = ('x', 'y', 'color')
+
     def __init__(self, x, y, color=(0, 0, 0)):
         self.x = x
         self.y = y
@@ -27,70 +139,36 @@ class Button:
         return (self.x, self.y)
 
 class Note:
-    def __init__(self, name, frequency, buttons, color, lp):
+    def __init__(self, name, frequency, buttons, color, lp, midi_values=None):
         self.name = name
         self.frequency = frequency
+        self.wave = generate_sine_wave(frequency, 1)  # 1-second buffer to keep the note playing, synthesized once
         self.buttons = buttons
         self.color = color
         self.lp = lp
-        self.playing_thread = None
-        self.stop_flag = threading.Event()
-        self.play_obj = None
+        self.midi_values = {} if midi_values is None else midi_values  # LED MIDI values for lp, shared with its owner
 
     def play(self):
-        if not self.playing_thread or not self.playing_thread.is_alive():
-            self.stop_flag.clear()
-            self.playing_thread = threading.Thread(target=self.play_note)
-            self.playing_thread.start()
+        sustainer.hold(self, [self.wave])
         self.light_up_buttons((255, 255, 255))
 
-    def play_note(self):
-        wave = generate_sine_wave(self.frequency, 1)  # 1-second buffer to keep the note playing
-        while not self.stop_flag.is_set():
-            if not self.play_obj or not self.play_obj.is_playing():
-                self.play_obj = play_wave(wave)
-            self.stop_flag.wait(0.1)  # Check the flag every 0.1 seconds
-
     def stop(self):
-        self.stop_flag.set()
-        if self.playing_thread and self.playing_thread.is_alive():
-            self.playing_thread.join()
-        if self.play_obj:
-            self.play_obj.stop()
+        sustainer.release(self)
         self.light_up_buttons(self.color)
 
     def light_up_buttons(self, color):
-        for button in self.buttons:
-            led = self.lp.panel.led(button.x, button.y)
-            led.color = color
+        send_leds(self.lp, ((button.x, button.y, color) for button in self.buttons), self.midi_values)
 
 class Chord:
     def __init__(self, notes):
         self.notes = notes
-        self.playing_thread = None
-        self.stop_flag = threading.Event()
-        self.play_objs = []
 
     def play(self):
-        if not self.playing_thread or not self.playing_thread.is_alive():
-            self.stop_flag.clear()
-            self.playing_thread = threading.Thread(target=self.play_chord)
-            self.playing_thread.start()
+        sustainer.hold(self, [note.wave for note in self.notes])  # 1-second buffers
         for note in self.notes:
             note.light_up_buttons((255, 255, 255))
 
-    def play_chord(self):
-        waves = [generate_sine_wave(note.frequency, 1) for note in self.notes]  # 1-second buffer
-        while not self.stop_flag.is_set():
-            if not self.play_objs or not any(play_obj.is_playing() for play_obj in self.play_objs):
-                self.play_objs = [play_wave(wave) for wave in waves]
-            self.stop_flag.wait(0.1)  # Check the flag every 0.1 seconds
-        for play_obj in self.play_objs:
-            play_obj.stop()
-
     def stop(self):
-        self.stop_flag.set()
-        if self.playing_thread and self.playing_thread.is_alive():
-            self.playing_thread.join()
+        sustainer.release(self)
         for note in self.notes:
             note.light_up_buttons(note.color)
@@ -1,26 +1,51 @@
+import atexit
+import os
+import pickle
+import queue
 import yaml
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from lpminimk3 import ButtonEvent, Mode, find_launchpads
-from note import Note, Button, Chord
+from note import Note, Button, Chord, send_leds
 import threading
 import simpleaudio as sa
 
+try:
+    from yaml import CSafeLoader as Loader  # libyaml-backed parser when available
+except ImportError:
+    from yaml import SafeLoader as Loader
+
+logger = logging.getLogger(__name__)
+
+_NOTE_FREQ = {
+    'C': 261.63,
+    'D': 293.66,
+    'E': 329.63,
+    'F': 349.23,
+    'G': 392.00,
+    'A': 440.00,
+    'B': 493.88
+}
+
 class LaunchpadSynth:
     def __init__(self, config_file):
+        self._last_led = {}  # (x, y) -> color last sent by set_leds; needed before init_launchpad clears the grid
+        self.led_midi_values = {}  # (x, y) -> MIDI value of that LED on self.lp in the programmer layout
         self.load_config(config_file)
         self.init_launchpad()
         self.notes = {}
         self.audio_files = {}
+        self.button_map = {}  # (x, y) -> Note or audio file entry
         self.active_chords = []
         self.button_events = []
         self.current_audio_play_obj = None  # To keep track of the current playing WAV file
         self.DEBOUNCE_WINDOW = 0.005  # Reduced debounce window
         self.debounce_timer = None
-        self.lock = threading.Lock()  # Lock for thread-safe operations
+        self.lock = threading.RLock()  # Re-entrant: event_loop holds it when process_button_events runs inline (debounce off)
+        self._ascii_grid = ''
 
     def load_config(self, config_file):
-        with open(config_file, 'r') as file:
-            config = yaml.safe_load(file)
+        config = self.read_config(config_file)
         self.model_name = config['name']
         self.models = config['models']
         self.scales = config['scales']
@@ -30,6 +55,27 @@ class LaunchpadSynth:
         self.debounce = config.get('debounce', True)  # Read debounce setting, default to True if not specified
         self.DEBOUNCE_WINDOW = 0.005 if self.debounce else 0  # Set debounce window based on setting
 
+    def read_config(self, config_file):
+        # Reuse the parsed config pickled next to the YAML as long as the YAML's mtime and size still match
+        cache_path = config_file + '.pkl'
+        stat = os.stat(config_file)
+        key = (stat.st_mtime_ns, stat.st_size)
+        try:
+            with open(cache_path, 'rb') as file:
+                cached_key, config = pickle.load(file)
+            if cached_key == key:
+                return config
+        except (OSError, pickle.UnpicklingError, EOFError, TypeError, ValueError):
+            pass
+        with open(config_file, 'r') as file:
+            config = yaml.load(file, Loader=Loader)
+        try:
+            with open(cache_path, 'wb') as file:
+                pickle.dump((key, config), file)
+        except OSError:
+            logger.warning("Could not write config cache %s", cache_path)
+        return config
+
     def init_launchpad(self):
         self.lp = find_launchpads()[0]
         if self.lp is None:
@@ -38,13 +84,35 @@ class LaunchpadSynth:
         self.lp.open()
         self.lp.mode = Mode.PROG
         self.clear_grid()
-        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        if not logging.getLogger().handlers:
+            # Log records are handed to a listener thread so the event loop never blocks on writing to the console
+            log_queue = queue.SimpleQueue()
+            console = logging.StreamHandler()
+            console.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+            self.log_listener = QueueListener(log_queue, console)
+            self.log_listener.start()
+            atexit.register(self.log_listener.stop)  # Flush records still queued at shutdown
+            root = logging.getLogger()
+            root.addHandler(QueueHandler(log_queue))  # No formatter of its own, so only the message is passed on
+            root.setLevel(logging.INFO)
 
     def clear_grid(self):
-        for x in range(9):
-            for y in range(9):
-                led = self.lp.panel.led(x, y)
-                led.color = (0, 0, 0)
+        self.set_leds((x, y, (0, 0, 0)) for x in range(9) for y in range(9))
+
+    def set_leds(self, leds):
+        # Only LEDs whose color differs from what was last sent go out, batched into one message
+        changed = []
+        for x, y, color in leds:
+            color = tuple(color) if isinstance(color, list) else color
+            if self._last_led.get((x, y)) != color:
+                changed.append((x, y, color))
+        send_leds(self.lp, changed, self.led_midi_values)
+        for x, y, color in changed:  # Only remember colors that were actually sent
+            self._last_led[(x, y)] = color
+
+    def forget_leds(self, buttons):
+        for button in buttons:
+            self._last_led.pop((button.x, button.y), None)
 
     def assign_notes_and_files(self, scale, model_name):
         layout = self.models[model_name]['layout'].strip().split('\n')
@@ -57,6 +125,7 @@ class LaunchpadSynth:
 
         self.notes = {}
         self.audio_files = {}
+        self.button_map = {}
 
         for y, row in enumerate(layout):
             for x, char in enumerate(row):
@@ -68,9 +137,10 @@ class LaunchpadSynth:
                     frequency = self.get_frequency_for_note(note_name)
                     color = self.colors[note_name]
                     if note_name not in self.notes:
-                        self.notes[note_name] = Note(note_name, frequency, [button], color, self.lp)
+                        self.notes[note_name] = Note(note_name, frequency, [button], color, self.lp, self.led_midi_values)
                     else:
                         self.notes[note_name].buttons.append(button)
+                    self.button_map[(x, y)] = self.notes[note_name]
                 elif char in file_mapping:
                     file_path = file_mapping[char]
                     color = self.file_colors.get(char, [255, 255, 255])  # Default to white if no color specified
@@ -78,51 +148,49 @@ class LaunchpadSynth:
                         self.audio_files[char] = {"file": file_path, "buttons": [button], "color": color}
                     else:
                         self.audio_files[char]["buttons"].append(button)
+                    self.button_map[(x, y)] = self.audio_files[char]
 
         self.initialize_grid()
-        logging.info(f"Grid partitioned: \n{self.get_ascii_grid()}")
+        logger.info("Grid partitioned: \n%s", self.get_ascii_grid())
 
     def initialize_grid(self):
+        leds = []
         for note in self.notes.values():
-            note.light_up_buttons(note.color)
+            leds.extend((button.x, button.y, note.color) for button in note.buttons)
         for char, audio in self.audio_files.items():
-            for button in audio["buttons"]:
-                led = self.lp.panel.led(button.x, button.y)
-                led.color = audio["color"]  # Set the color for audio file buttons
+            leds.extend((button.x, button.y, audio["color"]) for button in audio["buttons"])  # Set the color for audio file buttons
+        self.set_leds(leds)
+        self._ascii_grid = self.render_ascii_grid()  # Layout is fixed until the next assign_notes_and_files
 
     def get_frequency_for_note(self, note):
-        note_frequencies = {
-            'C': 261.63,
-            'D': 293.66,
-            'E': 329.63,
-            'F': 349.23,
-            'G': 392.00,
-            'A': 440.00,
-            'B': 493.88
-        }
-        return note_frequencies[note]
+        return _NOTE_FREQ[note]
 
     def get_ascii_grid(self):
+        return self._ascii_grid
+
+    def render_ascii_grid(self):
         grid = [['.' for _ in range(9)] for _ in range(9)]
         for note_name, note in self.notes.items():
             for button in note.buttons:
-                x, y = button.get_position()
+                x, y = button.x, button.y
                 grid[y][x] = note_name.lower()
         for char, audio in self.audio_files.items():
             for button in audio["buttons"]:
-                x, y = button.get_position()
+                x, y = button.x, button.y
                 grid[y][x] = char.lower()
         return '\n'.join([''.join(row) for row in grid])
 
     def start(self, scale, model_name):
         self.assign_notes_and_files(scale, model_name)
         print("Listening for button presses. Press Ctrl+C to exit.")
-        event_thread = threading.Thread(target=self.event_loop)
-        event_thread.start()
+        self.event_thread = threading.Thread(target=self.event_loop)
+        self.event_thread.start()
 
     def event_loop(self):
+        # poll_for_event() with no timeout blocks until an event arrives; build the 81-button group once
+        buttons = self.lp.panel.buttons()
         while True:
-            button_event = self.lp.panel.buttons().poll_for_event()
+            button_event = buttons.poll_for_event()
             if button_event:
                 with self.lock:
                     self.handle_event(button_event)
@@ -134,8 +202,8 @@ class LaunchpadSynth:
             self.handle_button_release(button_event.button)
 
     def handle_button_press(self, button):
-        logging.info(f"Button press detected at {button.x}, {button.y}")
-        self.button_events.append(button)
+        logger.info("Button press detected at %d, %d", button.x, button.y)
+        self.button_events.append((button.x, button.y))
         if self.debounce:
             if not self.debounce_timer:
                 self.debounce_timer = threading.Timer(self.DEBOUNCE_WINDOW, self.process_button_events)
@@ -148,35 +216,28 @@ class LaunchpadSynth:
             if not self.button_events:
                 return
 
-            for button in self.button_events:
-                x, y = button.x, button.y
-                logging.info(f"Processing button event at {x}, {y}")
-
-                for note in self.notes.values():
-                    for btn in note.buttons:
-                        if (x, y) == btn.get_position():
-                            note.play()
-                            break
+            for x, y in self.button_events:
+                logger.info("Processing button event at %d, %d", x, y)
 
-                for char, audio in self.audio_files.items():
-                    for btn in audio["buttons"]:
-                        if (x, y) == btn.get_position():
-                            self.play_sound(audio["file"])
-                            break
+                entry = self.button_map.get((x, y))
+                if isinstance(entry, Note):
+                    entry.play()
+                    self.forget_leds(entry.buttons)  # Note lights its own buttons while playing
+                elif entry:
+                    self.play_sound(entry["file"])
 
-            logging.info(f"Current grid: \n{self.get_ascii_grid()}")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Current grid: \n%s", self.get_ascii_grid())
             self.button_events.clear()
             self.debounce_timer = None
 
     def handle_button_release(self, button):
         x, y = button.x, button.y
-        logging.info(f"Button release detected at {x}, {y}")
-        for note in self.notes.values():
-            for btn in note.buttons:
-                if (x, y) == btn.get_position():
-                    note.stop()
-                    logging.info(f"Stopping note: {note.name}")
-                    break
+        logger.info("Button release detected at %d, %d", x, y)
+        note = self.button_map.get((x, y))
+        if isinstance(note, Note):
+            note.stop()
+            logger.info("Stopping note: %s", note.name)
 
     def play_sound(self, sound_file):
         # Stop the current audio if playing